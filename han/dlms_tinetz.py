@@ -1,11 +1,13 @@
 """Use this module to read HDLC frames."""
+# pylint: disable=protected-access
 from __future__ import annotations
 
-import binascii
 import logging
+import struct
+from typing import NamedTuple, Union
 
 import construct
-from Crypto.Cipher import AES
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
 from han.common import MeterMessageBase, MeterMessageType, MeterReaderBase
 
@@ -16,14 +18,14 @@ MBusDataLinkHeader: construct.Struct = construct.Struct(
     "Start_Character" / construct.Const(0x68, construct.Int8ub),
     "L_Field" / construct.Int8ub,
     "_L_Field" / construct.Int8ub,
-    "_l_field_check" / construct.Check(lambda ctx: ctx._L_Field == ctx.L_Field),
+    "_l_field_check" / construct.Check(construct.this._L_Field == construct.this.L_Field),
     "Start_Character" / construct.Const(0x68, construct.Int8ub),
-    "C_Field" / construct.OneOf(construct.Int8ub, [0x53, 0x73]),
+    "C_Field" / construct.ExprValidator(construct.Int8ub, (construct.obj_ & 0xDF) == 0x53),  # 0x53 or 0x73
     "A_Field" / construct.Const(0xFF, construct.Int8ub),
 )
 
 MBusTransportLayer: construct.Struct = construct.Struct(
-    "CI_Field" / construct.OneOf(construct.Int8ub, range(0x00, 0x1F)),
+    "CI_Field" / construct.ExprValidator(construct.Int8ub, (construct.obj_ & 0xE0) == 0),  # 0x00 to 0x1F inclusive
     "STSAP" / construct.Const(0x01, construct.Int8ub),
     "DTSAP" / construct.Const(0x67, construct.Int8ub),
 )
@@ -69,19 +71,98 @@ DLMSApplicationLayer: construct.Struct = construct.Struct(
 )
 
 
+# The construct declarations above document the wire format. The functions below are
+# hand-written equivalents used by DlmsTinetzFrameReader to avoid the construct
+# interpreter overhead on every received M-Bus frame.
+
+_Buffer = Union[bytes, bytearray, memoryview]
+
+_DLMS_APPLICATION_LAYER_HEADER = struct.Struct(">BB8sB")
+
+
+class _DlmsApplicationLayer(NamedTuple):
+    length: int
+    system_title: bytes
+    frame_counter: bytes
+    encrypted_payload: bytearray
+
+
+def _parse_mbus_data_link_header(data: _Buffer) -> int | None:
+    """Return the L field of M-Bus data link header, or None if not a valid header."""
+    if len(data) < 6:
+        return None
+    l_field = data[1]
+    if l_field < 5 or data[2] != l_field:
+        return None
+    if data[0] != 0x68 or data[3] != 0x68 or data[4] & 0xDF != 0x53 or data[5] != 0xFF:  # C field 0x53 or 0x73
+        return None
+    return l_field
+
+
+def _parse_mbus_data_link_layer(data: bytearray, l_field: int) -> tuple[int, bytearray] | None:
+    """
+    Return CI field and data of a complete M-Bus data link layer frame, or None if not a valid frame.
+
+    The header is not parsed again. Pass the L field returned by _parse_mbus_data_link_header.
+    The checksum is not verified. Use _is_valid_mbus_checksum.
+    """
+    if len(data) < l_field + 6:
+        return None
+    ci_field = data[6]
+    if ci_field & 0xE0 or data[7] != 0x01 or data[8] != 0x67 or data[l_field + 5] != 0x16:
+        return None
+    return ci_field, data[9 : l_field + 4]
+
+
+def _is_valid_mbus_checksum(data: _Buffer) -> bool:
+    """Return True if checksum of a complete M-Bus data link layer frame is correct."""
+    checksum_pos = data[1] + 4
+    return sum(data[4:checksum_pos]) & 0xFF == data[checksum_pos]
+
+
+def _parse_dlms_application_layer(data: bytearray) -> _DlmsApplicationLayer | None:
+    """Parse DLMS application layer of the first M-Bus frame in a message. Return None if not valid."""
+    if len(data) < _DLMS_APPLICATION_LAYER_HEADER.size + 5:
+        return None
+    (
+        ciphering_service,
+        system_title_length,
+        system_title,
+        length,
+    ) = _DLMS_APPLICATION_LAYER_HEADER.unpack_from(data)
+    if ciphering_service != 0xDB or system_title_length != 0x08:
+        return None
+    pos = _DLMS_APPLICATION_LAYER_HEADER.size
+    if length == 0x82:
+        length = int.from_bytes(data[pos : pos + 2], "big")
+        pos += 2
+    if len(data) < pos + 5 or data[pos] != 0x21:
+        return None
+    return _DlmsApplicationLayer(
+        length,
+        bytes(system_title),
+        bytes(data[pos + 1 : pos + 5]),
+        data[pos + 5 :],
+    )
+
+
 class DlmsTinetzFrame(MeterMessageBase):
-    def __init__(self, key_hex: str, length: int, system_title: bytes, frame_counter: bytes) -> None:
-        self._key = binascii.unhexlify(key_hex)
+    def __init__(self, algorithm: algorithms.AES, length: int, system_title: bytes, frame_counter: bytes) -> None:
+        self._algorithm = algorithm
         self._length = length
         self._system_title = system_title
         self._frame_counter = frame_counter
-        self._frame_data = bytearray()
+        # allocate the announced length up front so fragments are copied in place
+        self._frame_data = bytearray(max(length, 0))
+        self._write_pos = 0
 
     def __len__(self) -> int:
-        return len(self._frame_data)
+        return self._write_pos
 
-    def extend(self, data_chunk: bytes) -> None:
-        self._frame_data.extend(data_chunk)
+    def extend(self, data_chunk: _Buffer) -> None:
+        end_pos = self._write_pos + len(data_chunk)
+        self._frame_data[self._write_pos : end_pos] = data_chunk
+        self._write_pos = end_pos
 
     @property
     def message_type(self) -> MeterMessageType:
@@ -89,17 +170,18 @@ class DlmsTinetzFrame(MeterMessageBase):
 
     @property
     def is_valid(self) -> bool:
-        return len(self._frame_data) == self._length
+        return self._write_pos == self._length
 
     @property
     def as_bytes(self) -> bytes:
-        return bytes(self._frame_data)
+        return bytes(memoryview(self._frame_data)[: self._write_pos])
 
     @property
     def payload(self) -> bytes | None:
         i_v = self._system_title + self._frame_counter
-        cipher = AES.new(self._key, AES.MODE_GCM, nonce=i_v)
-        return cipher.decrypt(self._frame_data)
+        # The frame carries no authentication tag, so only the keystream is applied (no finalize).
+        decryptor = Cipher(self._algorithm, modes.GCM(i_v)).decryptor()
+        return decryptor.update(memoryview(self._frame_data)[: self._write_pos])
 
 
 class DlmsTinetzFrameReader(MeterReaderBase[DlmsTinetzFrame]):
@@ -109,7 +191,8 @@ class DlmsTinetzFrameReader(MeterReaderBase[DlmsTinetzFrame]):
     def __init__(self, key_hex: str) -> None:
         self._buffer = _ReaderBuffer()
         self._frame: DlmsTinetzFrame | None = None
-        self._key_hex = key_hex
+        # the key is fixed for the lifetime of the reader and shared by all frames
+        self._algorithm = algorithms.AES(bytes.fromhex(key_hex))
 
     @property
     def is_in_hunt_mode(self) -> bool:
@@ -121,73 +204,97 @@ class DlmsTinetzFrameReader(MeterReaderBase[DlmsTinetzFrame]):
         self._buffer.extend(data_chunk)
 
         while self._buffer.size >= 6:
-            try:
-                header = MBusDataLinkHeader.parse(self._buffer.as_bytes)
-                data_len = header.L_Field + 6
-
-                if self._buffer.size >= data_len:
-                    try:
-                        mbus_data = MBusDataLinkLayer.parse(self._buffer.as_bytes)
-
-                        ci_field = mbus_data.TransportLayer.CI_Field
-                        if self._frame is None and (ci_field & 0x0F == 0):
-                            dlms_data = DLMSApplicationLayer.parse(mbus_data.Data)
-
-                            self._frame = DlmsTinetzFrame(
-                                self._key_hex,
-                                dlms_data.Length - 5,
-                                bytes(dlms_data.System_Title),
-                                bytes(dlms_data.Frame_Counter),
-                            )
-                            self._frame.extend(dlms_data.Encrypted_Payload)
-
-                        elif self._frame is not None and (ci_field & 0x0F > 0):
-                            self._frame.extend(mbus_data.Data)
-
-                        if self._frame is not None and (ci_field & 0x10 == 0x10):
-                            if self._frame.is_valid:
-                                frames_received.append(self._frame)
-                            else:
-                                pass  # TODO log
-                                # _LOGGER.debug(...)
-                            self._frame = None
-
-                    except construct.ChecksumError:
-                        self._frame = None
-
-                    self._buffer.trim_buffer_to_pos(data_len)
-
+            l_field = _parse_mbus_data_link_header(self._buffer.peek(6))
+            if l_field is None:
+                self._goto_hunt_mode()
+                continue
+
+            data_len = l_field + 6
+            if self._buffer.size < data_len:
+                break
+
+            mbus_frame = self._buffer.peek(data_len)
+            data_link_layer = _parse_mbus_data_link_layer(mbus_frame, l_field)
+            if data_link_layer is None:
+                self._goto_hunt_mode()
+                continue
+
+            if not _is_valid_mbus_checksum(mbus_frame):
+                self._frame = None
+                self._buffer.trim_buffer_to_pos(data_len)
+                continue
+
+            ci_field, mbus_data = data_link_layer
+            if self._frame is None and (ci_field & 0x0F == 0):
+                dlms_data = _parse_dlms_application_layer(mbus_data)
+                if dlms_data is None:
+                    self._goto_hunt_mode()
+                    continue
+
+                self._frame = DlmsTinetzFrame(
+                    self._algorithm,
+                    dlms_data.length - 5,
+                    dlms_data.system_title,
+                    dlms_data.frame_counter,
+                )
+                self._frame.extend(dlms_data.encrypted_payload)
+
+            elif self._frame is not None and (ci_field & 0x0F > 0):
+                self._frame.extend(mbus_data)
+
+            if self._frame is not None and (ci_field & 0x10 == 0x10):
+                if self._frame.is_valid:
+                    frames_received.append(self._frame)
                 else:
-                    break
-
-            except construct.ConstructError:
+                    pass  # TODO log
+                    # _LOGGER.debug(...)
                 self._frame = None
-                self._buffer.trim_buffer_to_start_character_or_end()
+
+            self._buffer.trim_buffer_to_pos(data_len)
 
         return frames_received
 
+    def _goto_hunt_mode(self) -> None:
+        self._frame = None
+        self._buffer.trim_buffer_to_start_character_or_end()
+
 
 class _ReaderBuffer:
+    # Consumed bytes are only removed from the front of the buffer when this many have accumulated.
+    COMPACT_THRESHOLD: int = 0x10000
+
     def __init__(self) -> None:
         self._buffer = bytearray()
+        self._buffer_pos = 0
 
     @property
     def size(self) -> int:
-        return len(self._buffer)
+        return len(self._buffer) - self._buffer_pos
 
-    @property
-    def as_bytes(self) -> bytes:
-        return bytes(self._buffer)
+    def peek(self, length: int) -> bytearray:
+        # copy only the bytes to inspect, not the rest of the buffer, as hunt mode peeks at every start character
+        return self._buffer[self._buffer_pos : self._buffer_pos + length]
 
     def extend(self, data_chunk: bytes) -> None:
         self._buffer.extend(data_chunk)
 
     def trim_buffer_to_start_character_or_end(self) -> None:
-        pos = self._buffer.find(DlmsTinetzFrameReader.START_CHARACTER, 1)
+        pos = self._buffer.find(DlmsTinetzFrameReader.START_CHARACTER, self._buffer_pos + 1)
         if pos == -1:
             self._buffer.clear()
-        elif pos >= 1:
-            self._buffer = self._buffer[pos:]
+            self._buffer_pos = 0
+        else:
+            self._buffer_pos = pos
+            self._compact()
 
     def trim_buffer_to_pos(self, pos: int) -> None:
-        self._buffer = self._buffer[pos:]
+        self._buffer_pos += pos
+        self._compact()
+
+    def _compact(self) -> None:
+        if self._buffer_pos >= len(self._buffer):
+            self._buffer.clear()
+            self._buffer_pos = 0
+        elif self._buffer_pos > self.COMPACT_THRESHOLD:
+            del self._buffer[: self._buffer_pos]
+            self._buffer_pos = 0
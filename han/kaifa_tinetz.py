@@ -2,13 +2,21 @@
 # pylint: disable=protected-access
 from __future__ import annotations
 
-from datetime import datetime
+import logging
+import struct
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, List, Tuple
 
 import construct  # type: ignore
 
 from han import cosem, obis_map
 from han.obis import Obis
 
+_LOGGER = logging.getLogger(__name__)
+
+
 SimpleElement: construct.Struct = construct.Struct(
     "_element_type" / construct.Peek(cosem.CommonDataTypes),
     "obis" / cosem.ObisCodeOctedStringField,
@@ -63,29 +71,215 @@ NotificationBodyObisElements: construct.Struct = construct.Struct(
 LlcPdu: construct.Struct = cosem._get_apdu_struct(NotificationBodyObisElements)
 
 
-def _normalize_parsed_obis_elements_frame(frame: construct.Struct,) -> dict[str, str | int | float | datetime]:
+# APDU framing only. The notification body is decoded by _parse_notification_body.
+_ApduHeader: construct.Struct = cosem._get_apdu_struct(construct.GreedyBytes)
+
+_DATA_NOTIFICATION_TAG = 0x0F
+_DATE_TIME_LENGTH = 0x0C
+
+# COSEM common data type codes as int for comparing with raw bytes
+_NULL_DATA = int(cosem.CommonDataTypes.null_data)
+_STRUCTURE = int(cosem.CommonDataTypes.structure)
+_DOUBLE_LONG_UNSIGNED = int(cosem.CommonDataTypes.double_long_unsigned)
+_OCTET_STRING = int(cosem.CommonDataTypes.octet_string)
+_VISIBLE_STRING = int(cosem.CommonDataTypes.visible_string)
+_INTEGER = int(cosem.CommonDataTypes.integer)
+_LONG = int(cosem.CommonDataTypes.long)
+_LONG_UNSIGNED = int(cosem.CommonDataTypes.long_unsigned)
+_ENUM = int(cosem.CommonDataTypes.enum)
+
+_ObisElements = List[Tuple[bytes, Any]]
+"""Decoded notification body as list of raw 6 byte OBIS code and value."""
+
+# Fixed size number decoders by type code, compiled once
+_NUMBER_STRUCTS: dict[int, struct.Struct] = {
+    _INTEGER: struct.Struct(">b"),
+    _LONG: struct.Struct(">h"),
+    _LONG_UNSIGNED: struct.Struct(">H"),
+    _DOUBLE_LONG_UNSIGNED: struct.Struct(">I"),
+}
+
+_DATE_TIME_STRUCT = struct.Struct(">HBBBBBBBh")
+
+_SCALED_NUMBER_TYPES = (
+    _DOUBLE_LONG_UNSIGNED,
+    _LONG,
+    _LONG_UNSIGNED,
+)
+
+
+@lru_cache(maxsize=None)
+def _scale(scaler: int) -> Decimal:
+    """Return multiplication factor of scaler (exponent to the base of 10)."""
+    return Decimal(10) ** scaler
+
+
+def _decode_date_time(data: memoryview) -> datetime:
+    """Decode 12 byte COSEM date-time (see cosem.DateTime)."""
+    year, month, day_of_month, _, hour, minute, second, hundredths, deviation = _DATE_TIME_STRUCT.unpack_from(data)
+    if 0xFF in (hour, minute, second):
+        raise ValueError("Date-time without time of day")
+    return datetime(
+        year,
+        month,
+        day_of_month,
+        hour,
+        minute,
+        second,
+        hundredths * 10000 if hundredths != 0xFF else 0,
+        timezone(timedelta(minutes=deviation * -1)) if deviation != -0x8000 else None,
+    )
+
+
+def _decode_octet_string(data: memoryview, pos: int) -> tuple[datetime | str, int]:
+    """Decode octet string at pos as date-time if possible, else as text. Return value and next pos."""
+    end = pos + 1 + data[pos]
+    content = data[pos + 1 : end]
+    if len(content) == 12:
+        try:
+            return _decode_date_time(content), end
+        except ValueError:
+            pass
+    return bytes(content).rstrip(b"\x00").decode("ASCII"), end
+
+
+def _decode_visible_string(data: memoryview, pos: int) -> tuple[str, int]:
+    """Decode visible string at pos. Return value and next pos."""
+    end = pos + 1 + data[pos]
+    return str(data[pos + 1 : end], "ASCII"), end
+
+
+def _decode_value(data: memoryview, pos: int, type_code: int) -> tuple[Any, int]:
+    """Decode value of type_code at pos (see cosem.Field). Return value and next pos."""
+    number_struct = _NUMBER_STRUCTS.get(type_code)
+    if number_struct is not None:
+        return number_struct.unpack_from(data, pos)[0], pos + number_struct.size
+    if type_code == _OCTET_STRING:
+        return _decode_octet_string(data, pos)
+    if type_code == _VISIBLE_STRING:
+        return _decode_visible_string(data, pos)
+    if type_code == _NULL_DATA:
+        while pos < len(data) and data[pos] == _NULL_DATA:
+            pos += 1
+        return None, pos
+    raise ValueError(f"Unsupported value type {type_code}")
+
+
+def _decode_obis_code(data: memoryview, pos: int) -> tuple[bytes, int]:
+    """Decode OBIS code octet string at pos (see cosem.ObisCodeOctedStringField). Return code and next pos."""
+    if data[pos] != _OCTET_STRING or data[pos + 1] != 6:
+        raise ValueError("Expected OBIS code")
+    return bytes(data[pos + 2 : pos + 8]), pos + 8
+
+
+def _decode_struct_element(data: memoryview, pos: int) -> tuple[bytes, Any, int]:
+    """Decode structure of OBIS code, value and optional scaler-unit (see StructElement)."""
+    obis, pos = _decode_obis_code(data, pos + 2)  # skip structure type and length
+    content_type = data[pos]
+    pos += 1
+    value: Any
+    if content_type == _VISIBLE_STRING:
+        value, pos = _decode_visible_string(data, pos)
+    elif content_type == _OCTET_STRING:
+        value, pos = _decode_octet_string(data, pos)
+    elif content_type in _SCALED_NUMBER_TYPES:
+        unscaled_value, pos = _decode_value(data, pos, content_type)
+        # scaler-unit structure: structure, 2, integer, <scaler>, enum, <unit>
+        if pos + 6 > len(data):
+            raise ValueError("Incomplete scaler-unit structure")
+        if (
+            data[pos] != _STRUCTURE
+            or data[pos + 1] != 2
+            or data[pos + 2] != _INTEGER
+            or data[pos + 4] != _ENUM
+        ):
+            raise ValueError("Expected scaler-unit structure")
+        value = unscaled_value * _scale(_NUMBER_STRUCTS[_INTEGER].unpack_from(data, pos + 3)[0])
+        pos += 6
+    else:
+        raise ValueError(f"Unsupported structure content type {content_type}")
+    return obis, value, pos
+
+
+def _parse_notification_body(notification_body: bytes) -> _ObisElements:
+    """
+    Parse notification body of OBIS elements (see NotificationBodyObisElements).
+
+    The body is a structure where each element is either an OBIS code followed by a value (two fields),
+    or a structure with OBIS code, value and scaler-unit (one field). The element kind is decided by
+    peeking the type code.
+    """
+    data = memoryview(notification_body)
+    if len(data) < 2 or data[0] != _STRUCTURE:
+        raise ValueError("Expected notification body structure")
+    fields = data[1]
+
+    elements: _ObisElements = []
+    field_count = 0
+    pos = 2
+    try:
+        while field_count < fields:
+            if data[pos] == _STRUCTURE:
+                obis, value, pos = _decode_struct_element(data, pos)
+                field_count += 1
+            else:
+                obis, pos = _decode_obis_code(data, pos)
+                value, pos = _decode_value(data, pos + 1, data[pos])
+                field_count += 2
+            elements.append((obis, value))
+    except (IndexError, struct.error) as ex:
+        raise ValueError("Incomplete notification body") from ex
+
+    if field_count != fields:
+        raise ValueError(f"Expected {fields} fields in notification body, got {field_count}")
+    # GreedyRange(Element) in the construct declaration consumes every element that parses and _length_check
+    # then rejects a field count mismatch. Bytes that do not start an element are ignored, as by construct.
+    if data[pos : pos + 1] == bytes([_STRUCTURE]) or data[pos : pos + 2] == bytes([_OCTET_STRING, 6]):
+        raise ValueError(f"Notification body has more than {fields} fields")
+
+    return elements
+
+
+@lru_cache(maxsize=256)
+def _obis_element_name(obis: bytes) -> str:
+    """Return element name of raw OBIS code. Cached as a meter sends the same few codes in every frame."""
+    obis_group_cdr = Obis.from_string(".".join(f"{b}" for b in obis)).to_group_cdr_str()
+    return obis_map.obis_name_map.get(obis_group_cdr, obis_group_cdr)
+
+
+def _get_notification_body(frame_content: bytes) -> bytes:
+    """
+    Return notification body of data-notification APDU.
+
+    A data-notification has a fixed layout up to the notification body: tag, 4 bytes long-invoke-id-and-priority
+    and a date-time field which is either null-data, a date-time octet string or a bare date-time. The body
+    offset is found directly for these, and anything else falls back to the construct APDU declaration.
+    """
+    if len(frame_content) > 6 and frame_content[0] == _DATA_NOTIFICATION_TAG:
+        date_time_start = frame_content[5]
+        if date_time_start == _NULL_DATA:
+            return frame_content[6:]
+        if date_time_start == _OCTET_STRING and frame_content[6] == _DATE_TIME_LENGTH:
+            return frame_content[7 + _DATE_TIME_LENGTH :]
+        if date_time_start == _DATE_TIME_LENGTH:
+            return frame_content[6 + _DATE_TIME_LENGTH :]
+    return _ApduHeader.parse(frame_content).notification_body
+
+
+def _normalize_parsed_obis_elements_frame(elements: _ObisElements,) -> dict[str, str | int | float | datetime]:
     dictionary: dict[str, str | int | float | datetime] = {
         obis_map.FIELD_METER_MANUFACTURER: "KaifaTINETZ",
     }
 
-    list_items = frame.notification_body.list_items
-    for measure in list_items:
-        obis_group_cdr = Obis.from_string(measure.obis).to_group_cdr_str()
-        if obis_group_cdr in obis_map.obis_name_map:
-            element_name = obis_map.obis_name_map[obis_group_cdr]
-        else:
-            element_name = obis_group_cdr
-
-        if hasattr(measure.value, "datetime"):
-            dictionary[element_name] = measure.value.datetime
-        else:
-            dictionary[element_name] = measure.value
+    for obis, value in elements:
+        dictionary[_obis_element_name(obis)] = value
 
     return dictionary
 
 
 def decode_frame_content(frame_content: bytes,) -> dict[str, str | int | float | datetime]:
     """Decode meter LLC PDU frame content as a dictionary."""
-    parsed = LlcPdu.parse(frame_content)
-    print(parsed)
-    return _normalize_parsed_obis_elements_frame(parsed)
+    elements = _parse_notification_body(_get_notification_body(frame_content))
+    # formatting arguments are only evaluated when debug logging is enabled
+    _LOGGER.debug("Parsed notification body: %r", elements)
+    return _normalize_parsed_obis_elements_frame(elements)
@@ -4,12 +4,14 @@ from __future__ import annotations
 import argparse
 import datetime
 import decimal
+import functools
 import json
 import logging
 import signal
 import sys
 import time
-from asyncio import Queue, create_task, get_event_loop, run
+from asyncio import Queue, TimeoutError as AsyncTimeoutError, create_task, get_event_loop, run, wait_for
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 from influxdb import InfluxDBClient
@@ -96,87 +98,143 @@ def _json_converter(source: Any) -> str | None:
 
 
 _decoder = autodecoder.AutoDecoder()
+# Decoding runs outside the event loop thread. One worker keeps frames in order and the decoder single threaded.
+_decoder_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="decoder")
+
+# Points are written to InfluxDB when this many are queued, or when the oldest queued point is this old.
+_INFLUXDB_BATCH_SIZE = 100
+_INFLUXDB_FLUSH_INTERVAL = 5.0
+
+_INFLUXDB_MEASUREMENT = "kaifa_tinetz"
+_INFLUXDB_FIELDS = (
+    "voltage_l1",
+    "voltage_l2",
+    "voltage_l3",
+    "current_l1",
+    "current_l2",
+    "current_l3",
+    "active_power_import",
+    "active_power_export",
+    "active_power_import_total",
+    "active_power_export_total",
+    "reactive_power_import_total",
+    "reactive_power_export_total",
+)
 
 _influxdb_client: InfluxDBClient | None = None
 _args: argparse.Namespace | None
 
 
-def _measure_received(frame: bytes) -> None:
+def _is_influxdb_configured() -> bool:
+    return bool(
+        _args is not None
+        and _args.influxdb_host
+        and _args.influxdb_user
+        and _args.influxdb_pwd
+        and _args.influxdb_db
+    )
+
+
+def _create_influxdb_client() -> InfluxDBClient:
+    return InfluxDBClient(
+        host=_args.influxdb_host,
+        username=_args.influxdb_user,
+        password=_args.influxdb_pwd,
+        database=_args.influxdb_db,
+    )
+
+
+def _write_influxdb_points(influxdb_points: list[dict[str, Any]]) -> None:
+    """Write points to InfluxDB. This is blocking and is run in an executor thread."""
     global _influxdb_client
-    global _args
-    decoded_frame = _decoder.decode_message_payload(frame)
+    if _influxdb_client is None:
+        _influxdb_client = _create_influxdb_client()
+
+    for _ in range(2):
+        try:
+            _influxdb_client.write_points(influxdb_points)
+            break
+        except Exception as ex1:
+            LOG.error(ex1)
+            time.sleep(1)
+            try:
+                _influxdb_client = _create_influxdb_client()
+            except Exception as ex2:
+                LOG.error(ex2)
+    else:
+        _influxdb_client = None
+
+
+@functools.lru_cache(maxsize=8)
+def _influxdb_tags(meter_id: str, meter_device_name: str) -> dict[str, str]:
+    """Return tags of meter. The same dict is shared by all points of a meter and must not be modified."""
+    return {"meter_id": meter_id, "meter_device_name": meter_device_name}
+
+
+def _influxdb_point(decoded_frame: dict[str, Any]) -> dict[str, Any]:
+    # Points are written in batches. Without a time of their own the server would give all points of a batch
+    # the same timestamp, and they would overwrite each other.
+    return {
+        "measurement": _INFLUXDB_MEASUREMENT,
+        "time": datetime.datetime.now(datetime.timezone.utc),
+        "tags": _influxdb_tags(decoded_frame["meter_id"], decoded_frame["meter_device_name"]),
+        "fields": {field: decoded_frame[field] for field in _INFLUXDB_FIELDS},
+    }
+
+
+async def _process_influxdb_points(influxdb_queue: "Queue[dict[str, Any] | None]") -> None:
+    """Write queued points in batches until None is received. The open batch is written before returning."""
+    loop = get_event_loop()
+    done = False
+    while not done:
+        point = await influxdb_queue.get()
+        if point is None:
+            break
+        batch = [point]
+        flush_time = loop.time() + _INFLUXDB_FLUSH_INTERVAL
+        while len(batch) < _INFLUXDB_BATCH_SIZE:
+            try:
+                point = await wait_for(influxdb_queue.get(), flush_time - loop.time())
+            except AsyncTimeoutError:
+                break
+            if point is None:
+                done = True
+                break
+            batch.append(point)
+        try:
+            await loop.run_in_executor(None, _write_influxdb_points, batch)
+        except Exception as ex:
+            LOG.error(ex)
+
+
+async def _measure_received(
+    frame: bytes,
+    decoded_frame: dict[str, Any] | None,
+    influxdb_queue: "Queue[dict[str, Any] | None] | None",
+) -> None:
     if decoded_frame:
-        json_frame = json.dumps(decoded_frame, indent=4, default=_json_converter)
-        print()
-        LOG.debug("Decoded frame: %s", json_frame)
-
-        if (
-            _influxdb_client is None
-            and _args.influxdb_host
-            and _args.influxdb_user
-            and _args.influxdb_pwd
-            and _args.influxdb_db
-        ):
-            _influxdb_client = InfluxDBClient(
-                host=_args.influxdb_host,
-                username=_args.influxdb_user,
-                password=_args.influxdb_pwd,
-                database=_args.influxdb_db,
-            )
-
-        if _influxdb_client:
-            influxdb_points = [
-                {
-                    "measurement": "kaifa_tinetz",
-                    "tags": {
-                        "meter_id": decoded_frame["meter_id"],
-                        "meter_device_name": decoded_frame["meter_device_name"],
-                    },
-                    "fields": {
-                        "voltage_l1": decoded_frame["voltage_l1"],
-                        "voltage_l2": decoded_frame["voltage_l2"],
-                        "voltage_l3": decoded_frame["voltage_l3"],
-                        "current_l1": decoded_frame["current_l1"],
-                        "current_l2": decoded_frame["current_l2"],
-                        "current_l3": decoded_frame["current_l3"],
-                        "active_power_import": decoded_frame["active_power_import"],
-                        "active_power_export": decoded_frame["active_power_export"],
-                        "active_power_import_total": decoded_frame["active_power_import_total"],
-                        "active_power_export_total": decoded_frame["active_power_export_total"],
-                        "reactive_power_import_total": decoded_frame["reactive_power_import_total"],
-                        "reactive_power_export_total": decoded_frame["reactive_power_export_total"],
-                    },
-                }
-            ]
-            for _ in range(2):
-                try:
-                    _influxdb_client.write_points(influxdb_points)
-                    break
-                except Exception as ex1:
-                    LOG.error(ex1)
-                    time.sleep(1)
-                    try:
-                        _influxdb_client = InfluxDBClient(
-                            host=_args.influxdb_host,
-                            username=_args.influxdb_user,
-                            password=_args.influxdb_pwd,
-                            database=_args.influxdb_db,
-                        )
-                    except Exception as ex2:
-                        LOG.error(ex2)
-            else:
-                _influxdb_client = None
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug("Decoded frame: %s", json.dumps(decoded_frame, default=_json_converter))
+
+        if influxdb_queue is not None:
+            await influxdb_queue.put(_influxdb_point(decoded_frame))
     else:
         LOG.error("Could not decode frame content: %s", frame.hex())
 
 
-async def _process_frames(queue: "Queue[bytes]") -> None:
+async def _process_frames(queue: "Queue[bytes]", influxdb_queue: "Queue[dict[str, Any] | None] | None") -> None:
+    loop = get_event_loop()
     while True:
         frame = await queue.get()
         try:
-            _measure_received(frame)
+            # Only decoding is run in the executor. The payload of a DLMS TINETZ frame is decrypted by the protocol
+            # before it is queued, which takes some 50 microseconds and does not stall the event loop.
+            decoded_frame = await loop.run_in_executor(_decoder_executor, _decoder.decode_message_payload, frame)
+            await _measure_received(frame, decoded_frame, influxdb_queue)
         except Exception as ex:
             LOG.error(ex)
+        finally:
+            queue.task_done()
 
 
 async def main() -> None:
@@ -188,7 +246,13 @@ async def main() -> None:
 
     queue: Queue[bytes] = Queue()
 
-    create_task(_process_frames(queue))
+    influxdb_queue: Queue[dict[str, Any] | None] | None = None
+    influxdb_task = None
+    if _is_influxdb_configured():
+        influxdb_queue = Queue()
+        influxdb_task = create_task(_process_influxdb_points(influxdb_queue))
+
+    create_task(_process_frames(queue, influxdb_queue))
 
     async def tcp_connection_factory() -> MeterTransportProtocol:
         host, port = args.hostandport
@@ -219,6 +283,12 @@ async def main() -> None:
         loop.add_signal_handler(signal.SIGINT, transport.close)
         await protocol.done
 
+    # decode frames received before the connection was closed and write the last batch of points
+    await queue.join()
+    if influxdb_queue is not None and influxdb_task is not None:
+        await influxdb_queue.put(None)
+        await influxdb_task
+
     LOG.info("Done...")
 
 
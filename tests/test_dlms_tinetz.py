@@ -0,0 +1,123 @@
+"""DLMS TINETZ tests."""
+# pylint: disable = no-self-use, protected-access
+from __future__ import annotations
+
+import construct
+import pytest
+
+from han import dlms_tinetz
+
+KEY_HEX = "36C66639E48A8CA4D6BC8B282A793BBB"
+
+MBUS_FRAME_FIRST = (
+    "6823236853ff000167"
+    "db084b464d102000000182002721000003e8fbae7eff3eb34c3717c71623"
+    "12"
+    "16"
+)
+MBUS_FRAME_LAST = (
+    "681b1b6853ff110167"
+    "5d6c2d8b848c0eeb581038fb4f36c5bb9014c8461f24"
+    "ea"
+    "16"
+)
+PLAIN_PAYLOAD = "0f000000010c07e50a0f05110f1e00ff800000020109060100010700ff06000005dc"
+
+
+class TestDlmsTinetzFrameReader:
+    """Test DlmsTinetzFrameReader."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 5, 64])
+    def test_read_frame_in_chunks(self, chunk_size):
+        """Test reading a message split in two M-Bus frames from chunks."""
+        data_feed = bytes.fromhex(MBUS_FRAME_FIRST + MBUS_FRAME_LAST)
+
+        frame_reader = dlms_tinetz.DlmsTinetzFrameReader(KEY_HEX)
+        frames = []
+        for pos in range(0, len(data_feed), chunk_size):
+            frames += frame_reader.read(data_feed[pos : pos + chunk_size])
+
+        assert len(frames) == 1
+        assert frames[0].is_valid
+        assert frames[0].payload == bytes.fromhex(PLAIN_PAYLOAD)
+        assert frame_reader.is_in_hunt_mode
+
+    def test_start_read_in_frame(self):
+        """Test start reading in middle of frame."""
+        data_feed = bytes.fromhex(
+            MBUS_FRAME_LAST[10:] + MBUS_FRAME_FIRST + MBUS_FRAME_LAST
+        )
+
+        frames = dlms_tinetz.DlmsTinetzFrameReader(KEY_HEX).read(data_feed)
+
+        assert len(frames) == 1
+        assert frames[0].payload == bytes.fromhex(PLAIN_PAYLOAD)
+
+    @pytest.mark.parametrize("key_hex", ["", "36C66639", "36C66639E48A8CA4D6BC8B282A793BBX"])
+    def test_invalid_key(self, key_hex):
+        """Test invalid key is rejected when reader is created."""
+        with pytest.raises(ValueError):
+            dlms_tinetz.DlmsTinetzFrameReader(key_hex)
+
+    def test_key_with_spaces(self):
+        """Test key with spaces between bytes."""
+        data_feed = bytes.fromhex(MBUS_FRAME_FIRST + MBUS_FRAME_LAST)
+        key_hex = " ".join(KEY_HEX[pos : pos + 2] for pos in range(0, len(KEY_HEX), 2))
+
+        frames = dlms_tinetz.DlmsTinetzFrameReader(key_hex).read(data_feed)
+
+        assert frames[0].payload == bytes.fromhex(PLAIN_PAYLOAD)
+
+    def test_wrong_checksum_is_discarded(self):
+        """Test message with wrong M-Bus checksum is discarded."""
+        data_feed = bytearray.fromhex(MBUS_FRAME_FIRST + MBUS_FRAME_LAST)
+        data_feed[-2] ^= 0xFF
+
+        frames = dlms_tinetz.DlmsTinetzFrameReader(KEY_HEX).read(data_feed)
+
+        assert len(frames) == 0
+
+
+class TestParsers:
+    """Test hand-written parsers against construct declarations."""
+
+    def test_mbus_data_link_layer(self):
+        """Test M-Bus data link layer."""
+        data = bytearray.fromhex(MBUS_FRAME_FIRST)
+        parsed = dlms_tinetz.MBusDataLinkLayer.parse(data)
+
+        ci_field, mbus_data = dlms_tinetz._parse_mbus_data_link_layer(data, data[1])
+
+        assert ci_field == parsed.TransportLayer.CI_Field
+        assert mbus_data == parsed.Data
+        assert dlms_tinetz._is_valid_mbus_checksum(data)
+
+    def test_mbus_data_link_layer_wrong_checksum(self):
+        """Test M-Bus data link layer with wrong checksum."""
+        data = bytearray.fromhex(MBUS_FRAME_FIRST)
+        data[-2] ^= 0xFF
+
+        with pytest.raises(construct.ChecksumError):
+            dlms_tinetz.MBusDataLinkLayer.parse(data)
+        assert dlms_tinetz._parse_mbus_data_link_layer(data, data[1]) is not None
+        assert not dlms_tinetz._is_valid_mbus_checksum(data)
+
+    @pytest.mark.parametrize(
+        "header",
+        ["6823236853", "6923236853ff", "6823246853ff", "6823236854ff", "6823236853fe", "6804046853ff"],
+    )
+    def test_invalid_mbus_data_link_header(self, header):
+        """Test invalid M-Bus data link header."""
+        assert dlms_tinetz._parse_mbus_data_link_header(bytes.fromhex(header)) is None
+
+    def test_dlms_application_layer(self):
+        """Test DLMS application layer."""
+        data = bytearray.fromhex(MBUS_FRAME_FIRST)[9:-2]
+        parsed = dlms_tinetz.DLMSApplicationLayer.parse(data)
+
+        dlms_data = dlms_tinetz._parse_dlms_application_layer(data)
+
+        assert dlms_data.length == parsed.Length
+        assert dlms_data.system_title == bytes(parsed.System_Title)
+        assert dlms_data.frame_counter == bytes(parsed.Frame_Counter)
+        assert dlms_data.encrypted_payload == parsed.Encrypted_Payload
@@ -0,0 +1,113 @@
+"""Kaifa TINETZ tests."""
+# pylint: disable = no-self-use, protected-access
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from han import kaifa_tinetz
+
+list_1 = bytes.fromhex(
+    (
+        "0f"
+        "00000102"
+        "0c07e50a0fff110f1e00800000"
+        "0212"
+        "09060000010000ff 090c07e50a0fff110f1e00800000"
+        "09060000600100ff 0a0c313233343536373839303132"
+        "090600002a0000ff 0a104b464d31323030323030303030303031"
+        "0203 09060100200700ff 1208fd 02020fff1623"
+        "0203 09060100340700ff 120907 02020fff1623"
+        "0203 09060100480700ff 120911 02020fff1623"
+        "0203 090601001f0700ff 12007b 02020ffe1621"
+        "0203 09060100330700ff 12002d 02020ffe1621"
+        "0203 09060100470700ff 10fff9 02020ffe1621"
+        "0203 09060100010700ff 06000005dc 02020f00161b"
+        "0203 09060100020700ff 0600000000 02020f00161b"
+        "0203 09060100010800ff 0600bc614e 02020f00161e"
+        "0203 09060100020800ff 0600000000 02020f00161e"
+        "0203 09060100030800ff 0600001538 02020f001620"
+        "0203 09060100040800ff 0600000063 02020f001620"
+    ).replace(" ", "")
+)
+
+
+class TestDecodeFrame:
+    """Test decode frame."""
+
+    def test_decode_frame_list_1(self):
+        """Test decode of list 1."""
+        decoded = kaifa_tinetz.decode_frame_content(list_1)
+
+        assert decoded == {
+            "meter_manufacturer": "KaifaTINETZ",
+            "meter_datetime": datetime(2021, 10, 15, 17, 15, 30),
+            "meter_id": "123456789012",
+            "meter_device_name": "KFM1200200000001",
+            "voltage_l1": Decimal("230.1"),
+            "voltage_l2": Decimal("231.1"),
+            "voltage_l3": Decimal("232.1"),
+            "current_l1": Decimal("1.23"),
+            "current_l2": Decimal("0.45"),
+            "current_l3": Decimal("-0.07"),
+            "active_power_import": Decimal("1500"),
+            "active_power_export": Decimal("0"),
+            "active_power_import_total": Decimal("12345678"),
+            "active_power_export_total": Decimal("0"),
+            "reactive_power_import_total": Decimal("5432"),
+            "reactive_power_export_total": Decimal("99"),
+        }
+
+    def test_decode_frame_same_as_construct(self):
+        """Test hand-written notification body parser gives same elements as construct declaration."""
+        parsed = kaifa_tinetz.LlcPdu.parse(list_1)
+
+        elements = kaifa_tinetz._parse_notification_body(
+            kaifa_tinetz._ApduHeader.parse(list_1).notification_body
+        )
+
+        assert len(elements) == len(parsed.notification_body.list_items)
+        for (obis, value), item in zip(elements, parsed.notification_body.list_items):
+            assert ".".join(f"{b}" for b in obis) == item.obis
+            assert value == getattr(item.value, "datetime", item.value)
+
+    @pytest.mark.parametrize(
+        "date_time",
+        ["0c07e50a0fff110f1e00800000", "090c07e50a0fff110f1e00800000", "00"],
+    )
+    def test_notification_body_same_as_construct(self, date_time):
+        """Test notification body found at fixed offset is same as parsed by construct declaration."""
+        frame_content = list_1[:5] + bytes.fromhex(date_time) + list_1[18:]
+
+        notification_body = kaifa_tinetz._get_notification_body(frame_content)
+
+        assert notification_body == kaifa_tinetz._ApduHeader.parse(frame_content).notification_body
+        assert notification_body == list_1[18:]
+
+    @pytest.mark.parametrize("trailing", ["00", "16", "0000"])
+    def test_decode_frame_with_trailing_bytes(self, trailing):
+        """Test bytes after the last field are ignored."""
+        assert kaifa_tinetz.decode_frame_content(list_1 + bytes.fromhex(trailing)) == kaifa_tinetz.decode_frame_content(
+            list_1
+        )
+
+    def test_decode_frame_with_lower_field_count(self):
+        """Test elements after the announced number of fields are not silently dropped."""
+        frame_content = bytearray(list_1)
+        frame_content[19] = 0x10
+
+        with pytest.raises(ValueError):
+            kaifa_tinetz.decode_frame_content(bytes(frame_content))
+
+    def test_decode_frame_with_trailing_element(self):
+        """Test element after the last field is rejected."""
+        with pytest.raises(ValueError):
+            kaifa_tinetz.decode_frame_content(list_1 + bytes.fromhex("09060000010000ff 0600000000".replace(" ", "")))
+
+    @pytest.mark.parametrize("length", [20, 100, len(list_1) - 1])
+    def test_decode_truncated_frame(self, length):
+        """Test decode of truncated frame fails with ValueError."""
+        with pytest.raises(ValueError):
+            kaifa_tinetz.decode_frame_content(list_1[:length])